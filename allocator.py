@@ -0,0 +1,136 @@
+# allocator.py
+from collections import deque, Counter
+import numpy as np
+
+HIGH_PAPER_SIZE = 10
+
+def order_papers(paper_groups, threshold=HIGH_PAPER_SIZE):
+    sizes = {p: len(g) for p, g in paper_groups.items() if len(g)}
+    high = [p for p in sizes if sizes[p] >= threshold]
+    low = [p for p in sizes if sizes[p] < threshold]
+    return high + low
+
+class RoomGrid:
+    # seat holds a global student index (-1 for an empty seat) and paper the
+    # index into SeatAllocator.papers; both are (rows, cols) int32 arrays
+    def __init__(self, allocator, seat, paper):
+        self.allocator = allocator
+        self.seat = seat
+        self.paper = paper
+        self.rows, self.cols = seat.shape
+
+    def _lookup(self, values, index, empty=""):
+        out = np.full(index.shape, empty, dtype=object)
+        mask = index >= 0
+        out[mask] = values[index[mask]]
+        return out.tolist()
+
+    @property
+    def rolls(self):
+        return self._lookup(self.allocator.rolls, self.seat)
+
+    @property
+    def depts(self):
+        return self._lookup(self.allocator.depts, self.seat)
+
+    @property
+    def papers(self):
+        return self._lookup(self.allocator.paper_codes, self.paper)
+
+    def dominant_depts(self):
+        # most common department per column, ties going to the one seated first
+        depts = self.depts
+        headers = []
+        for c in range(self.cols):
+            counts = Counter(row[c] for row in depts if row[c])
+            headers.append(counts.most_common(1)[0][0] if counts else "")
+        return headers
+
+    @property
+    def occupied(self):
+        return int((self.seat >= 0).sum())
+
+class SeatAllocator:
+    # Columns alternate between the first two papers in the queue (even
+    # columns take queue[0], odd columns queue[1]); a paper leaves the queue
+    # as soon as its last student is seated and the next one moves up.
+    # checkpoints[i] is the state before the i-th room was filled, so a plan
+    # can be resumed from any room with restore().
+    def __init__(self, paper_groups, threshold=HIGH_PAPER_SIZE):
+        self.papers = order_papers(paper_groups, threshold)
+        self.paper_codes = np.array(self.papers, dtype=object)
+        sizes = [len(paper_groups[p]) for p in self.papers]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.rolls = np.empty(self.offsets[-1], dtype=object)
+        self.depts = np.empty(self.offsets[-1], dtype=object)
+        self.rolls[:] = [roll for p in self.papers for roll, _ in paper_groups[p]]
+        self.depts[:] = [dept for p in self.papers for _, dept in paper_groups[p]]
+        self.cursor = self.offsets[:-1].copy()
+        self.queue = deque(range(len(self.papers)))
+        self.checkpoints = []
+
+    def snapshot(self):
+        # students seated so far per paper, and the paper queue
+        return (self.cursor - self.offsets[:-1]).astype(np.int32), list(self.queue)
+
+    def restore(self, seated, queue):
+        self.cursor = self.offsets[:-1].copy()
+        self.cursor[:len(seated)] += seated
+        self.queue = deque(queue)
+
+    def remaining(self, k):
+        return int(self.offsets[k + 1] - self.cursor[k])
+
+    def _drop(self, pos):
+        if pos == 0:
+            self.queue.popleft()
+        else:
+            first = self.queue.popleft()
+            self.queue.popleft()
+            self.queue.appendleft(first)
+
+    def fill_room(self, rows, cols):
+        self.checkpoints.append(self.snapshot())
+        total = rows * cols
+        # seats are visited column by column; flat index s sits in column s // rows
+        odd = (np.arange(total) // rows) % 2 == 1
+        even_cum = np.cumsum(~odd)
+        odd_cum = np.cumsum(odd)
+        seat = np.full(total, -1, dtype=np.int32)
+        paper = np.full(total, -1, dtype=np.int32)
+
+        pos = 0
+        while pos < total and self.queue:
+            p1 = self.queue[0]
+            p2 = self.queue[1] if len(self.queue) > 1 else None
+            base_e = even_cum[pos - 1] if pos else 0
+            base_o = odd_cum[pos - 1] if pos else 0
+            # seat where each paper places its last student, or total if it doesn't run out here
+            end1 = int(np.searchsorted(even_cum, base_e + self.remaining(p1)))
+            end2 = int(np.searchsorted(odd_cum, base_o + self.remaining(p2))) if p2 is not None else total
+            stop = min(end1, end2, total - 1) + 1
+
+            span = np.arange(pos, stop)
+            for k, sel in ((p1, span[~odd[pos:stop]]), (p2, span[odd[pos:stop]])):
+                if k is None or not len(sel): continue
+                seat[sel] = self.cursor[k] + np.arange(len(sel))
+                paper[sel] = k
+                self.cursor[k] += len(sel)
+
+            if end1 < total and end1 == stop - 1: self._drop(0)
+            elif end2 < total and end2 == stop - 1: self._drop(1)
+            pos = stop
+
+        shape = (cols, rows)
+        return RoomGrid(self, seat.reshape(shape).T.copy(), paper.reshape(shape).T.copy())
+
+def fill_rooms(allocator, rooms):
+    plan = []
+    for name, rows, cols in rooms:
+        if not allocator.queue: break
+        plan.append((name, allocator.fill_room(rows, cols)))
+    return plan
+
+def allocate(rooms, paper_groups, threshold=HIGH_PAPER_SIZE):
+    allocator = SeatAllocator(paper_groups, threshold)
+    return allocator, fill_rooms(allocator, rooms)
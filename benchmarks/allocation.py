@@ -0,0 +1,57 @@
+# benchmarks/allocation.py
+# python -m benchmarks.allocation [--students 1000 20000 200000] [--rooms 5 50 500]
+import argparse, math, random, time, tracemalloc
+from allocator import allocate
+
+DEPTS = ["CSE", "ECE", "ME", "CE", "EE", "IT", "CHE", "BT"]
+
+def synthetic_cohort(students, papers, seed=0):
+    rnd = random.Random(seed)
+    # skewed paper sizes so the high/low ordering and short papers both get exercised
+    weights = [1 / (i + 1) for i in range(papers)]
+    counts = [max(1, int(students * w / sum(weights))) for w in weights]
+    groups = {}
+    roll = 10000000000
+    for i, n in enumerate(counts):
+        groups[f"P{i:04d}"] = [(str(roll + j), rnd.choice(DEPTS)) for j in range(n)]
+        roll += n
+    return groups
+
+def synthetic_rooms(students, rooms):
+    # leave headroom for odd columns that stay empty once a single paper remains
+    seats = math.ceil(2 * students / rooms)
+    cols = max(2, round(math.sqrt(seats)))
+    rows = math.ceil(seats / cols)
+    return [(f"R{i:03d}", rows, cols) for i in range(rooms)]
+
+def run(students, rooms, papers):
+    groups = synthetic_cohort(students, papers)
+    layout = synthetic_rooms(students, rooms)
+    start = time.perf_counter()
+    allocator, plan = allocate(layout, groups)
+    elapsed = time.perf_counter() - start
+    # separate traced run so tracemalloc overhead doesn't skew the timing
+    tracemalloc.start()
+    allocate(layout, groups)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seated = sum(grid.occupied for _, grid in plan)
+    assert seated == sum(len(g) for g in groups.values())
+    return elapsed, peak, seated, len(plan)
+
+def main():
+    parser = argparse.ArgumentParser(description="Seat allocation benchmark")
+    parser.add_argument("--students", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--rooms", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--papers", type=int, default=None, help="papers per cohort (default: students // 100, at least 4)")
+    args = parser.parse_args()
+
+    print(f"{'students':>9} {'rooms':>6} {'papers':>7} {'used':>5} {'seated':>8} {'time ms':>9} {'peak MiB':>9}")
+    for students in args.students:
+        for rooms in args.rooms:
+            papers = args.papers or max(4, students // 100)
+            elapsed, peak, seated, used = run(students, rooms, papers)
+            print(f"{students:>9} {rooms:>6} {papers:>7} {used:>5} {seated:>8} {elapsed * 1000:>9.1f} {peak / 2**20:>9.2f}")
+
+if __name__ == "__main__":
+    main()
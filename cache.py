@@ -0,0 +1,153 @@
+# cache.py
+import hashlib, os, pickle, stat, tempfile, threading
+from collections import OrderedDict
+
+CACHE_DIR = os.environ.get("SEATING_CACHE_DIR") or None
+# The byte budget applies to each cache in each process. Every pool worker
+# keeps its own rosters, templates and mappings caches and the API process
+# keeps the results cache, so memory can reach about
+# (3 * SEATING_MAX_WORKERS + 1) * SEATING_CACHE_MAX_BYTES.
+CACHE_MAX_BYTES = int(os.environ.get("SEATING_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CACHE_MAX_ITEMS = int(os.environ.get("SEATING_CACHE_MAX_ITEMS", 256))
+CACHE_DISK_MAX_BYTES = int(os.environ.get("SEATING_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        # length-prefix every part so ("ab", "c") and ("a", "bc") differ
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+def private_dir(directory):
+    # pickles and plans are only read back from a directory this process
+    # owns and nobody else can write to
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{directory} is not a directory")
+    if os.name == "posix" and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise PermissionError(f"{directory} must be owned by this user with mode 0700")
+    return directory
+
+def sizeof(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 64
+
+class ContentCache:
+    # LRU bounded by item count and total bytes, with an optional pickle
+    # tier on disk shared by every process pointed at the same directory
+    def __init__(self, name, max_items=CACHE_MAX_ITEMS, max_bytes=CACHE_MAX_BYTES,
+                 disk_dir=CACHE_DIR, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        self.lock = threading.Lock()
+        if self.disk_dir:
+            private_dir(disk_dir)
+            private_dir(self.disk_dir)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+        value = self._disk_get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._store(key, value, sizeof(value))
+        return value
+
+    def put(self, key, value, size=None):
+        size = sizeof(value) if size is None else size
+        self._store(key, value, size)
+        self._disk_put(key, value)
+        return value
+
+    def get_or_set(self, key, make):
+        value = self.get(key)
+        return self.put(key, make()) if value is None else value
+
+    def _store(self, key, value, size):
+        with self.lock:
+            if size > self.max_bytes: return
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_items or self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _disk_get(self, key):
+        if not self.disk_dir: return None
+        try:
+            with open(self._path(key), "rb") as f:
+                value = pickle.load(f)
+            os.utime(self._path(key))
+            return value
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError,
+                AttributeError, ImportError):
+            # unreadable, or pickled by code that has since changed: a miss
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir: return
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp): os.unlink(tmp)
+            return
+        self._disk_prune()
+
+    def _disk_prune(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pkl"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes: break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "items": len(self.entries),
+                "bytes": self.bytes,
+            }
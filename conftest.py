@@ -0,0 +1,2 @@
+# conftest.py
+# keeps the repo root importable for tests/ under plain `pytest`
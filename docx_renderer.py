@@ -0,0 +1,161 @@
+# docx_renderer.py
+import io, os, zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.oxml.table import CT_Tbl
+from lxml import etree
+
+RENDER_WORKERS = int(os.environ.get("SEATING_DOCX_WORKERS", 1))
+
+# Room pages are built as WordprocessingML strings that match what
+# python-docx writes for add_paragraph / cell.text / add_page_break, plus the
+# explicit tcBorders we have always set, and spliced into the saved
+# document.xml in place of a marker paragraph. Nothing per seat goes through
+# python-docx or lxml.
+MARKER = "__SEATING_ROOM_PAGES__"
+BORDERS = "<w:tcBorders>" + "".join(
+    f'<w:{edge} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+    for edge in ('top', 'left', 'bottom', 'right')
+) + "</w:tcBorders>"
+BOLD = "<w:rPr><w:b/></w:rPr>"
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+CELL_CLOSE = "</w:p></w:tc>"
+
+@lru_cache(maxsize=64)
+def cell_open(width):
+    return (f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/>{BORDERS}</w:tcPr>'
+            '<w:p><w:pPr><w:jc w:val="center"/></w:pPr>')
+
+def _t(text):
+    space = ' xml:space="preserve"' if len(text.strip()) < len(text) else ""
+    return f"<w:t{space}>{escape(text)}</w:t>"
+
+@lru_cache(maxsize=4096)
+def run_xml(text, bold=False):
+    # mirrors python-docx's run text setter: tabs -> w:tab, newlines -> w:br
+    parts, buf = [], []
+    for ch in text:
+        if ch == "\t" or ch in "\r\n":
+            if buf: parts.append(_t("".join(buf)))
+            buf = []
+            parts.append("<w:tab/>" if ch == "\t" else "<w:br/>")
+        else:
+            buf.append(ch)
+    if buf: parts.append(_t("".join(buf)))
+    inner = (BOLD if bold else "") + "".join(parts)
+    return f"<w:r>{inner}</w:r>" if inner else "<w:r/>"
+
+def paragraph_xml(text, align, bold=False):
+    return f'<w:p><w:pPr><w:jc w:val="{align}"/></w:pPr>{run_xml(text, bold) if text else ""}</w:p>'
+
+def header_xml(date, time, room_name):
+    return (paragraph_xml(f"DATE: {date}", "left")
+            + paragraph_xml(f"TIME: {time}", "right", True)
+            + paragraph_xml(f"SEATING ARRANGEMENT FOR ROOM NO. {room_name}", "center", True))
+
+def summary_xml(room, dept_map, paper_map):
+    summary = defaultdict(int)
+    for r, row in enumerate(room):
+        for c, roll in enumerate(row):
+            if roll: summary[(dept_map[r][c], paper_map[r][c])] += 1
+    return "".join(paragraph_xml(f"{dept.upper()} (PAPER CODE {paper}) – {{{count}}}", "center", True)
+                   for (dept, paper), count in summary.items())
+
+def rows_xml(room, dept_map, headers, width):
+    cols = len(headers)
+    open_tc = cell_open(width)
+    out = ["<w:tr>"]
+    for c in range(cols):
+        label = "ROW-1" if c < cols // 2 else "ROW-2"
+        out.append(open_tc + run_xml(f"{headers[c]}\n{label}", True) + CELL_CLOSE)
+    out.append("</w:tr>")
+    for r, row in enumerate(room):
+        out.append("<w:tr>")
+        for c, roll in enumerate(row):
+            d, dom = dept_map[r][c], headers[c]
+            out.append(open_tc + run_xml(roll if d == dom else f"{roll} ({d})") + CELL_CLOSE)
+        out.append("</w:tr>")
+    return "".join(out)
+
+def room_page_xml(room_name, date, time, room, dept_map, paper_map, headers, shell, width):
+    return "".join([
+        header_xml(date, time, room_name),
+        summary_xml(room, dept_map, paper_map),
+        "<w:tbl>", shell, rows_xml(room, dept_map, headers, width), "</w:tbl>",
+    ])
+
+class TableShells:
+    # serialized tblPr/tblGrid for each column count, made by python-docx
+    # itself so the 'Table Grid' style id and column widths follow the template
+    def __init__(self, width, style_id):
+        self.width = width
+        self.style_id = style_id
+        self.shells = {}
+
+    def get(self, cols):
+        if cols not in self.shells:
+            tbl = CT_Tbl.new_tbl(0, cols, self.width)
+            tbl.tblStyle_val = self.style_id
+            grid_cols = tbl.tblGrid.findall(qn('w:gridCol'))
+            width = grid_cols[0].get(qn('w:w')) if grid_cols else "0"
+            shell = "".join(etree.tostring(child, encoding=str) for child in tbl)
+            self.shells[cols] = (shell.replace(f' xmlns:w="{tbl.nsmap["w"]}"', ""), width)
+        return self.shells[cols]
+
+def splice_pages(docx_bytes, partname, pages):
+    src = zipfile.ZipFile(io.BytesIO(docx_bytes))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename == partname:
+                xml = data.decode("utf-8")
+                at = xml.index(MARKER)
+                start, end = xml.rindex("<w:p>", 0, at), xml.index("</w:p>", at) + len("</w:p>")
+                data = "".join([xml[:start], *pages, xml[end:]]).encode("utf-8")
+            dst.writestr(info, data)
+    return out.getvalue()
+
+class Template:
+    # the uploaded template parsed once and saved with the marker paragraph
+    # appended; requests only splice into these bytes, so one Template can be
+    # shared (and cached) without ever being mutated
+    def __init__(self, template_bytes):
+        doc = Document(io.BytesIO(template_bytes))
+        self.shells = TableShells(doc._block_width, doc.part.get_style_id('Table Grid', WD_STYLE_TYPE.TABLE))
+        self.partname = doc.part.partname.membername
+        doc.add_paragraph(MARKER)
+        buf = io.BytesIO()
+        doc.save(buf)
+        self.docx_bytes = buf.getvalue()
+
+    @property
+    def nbytes(self):
+        return len(self.docx_bytes)
+
+def render_pages(template, plan, date, time, workers=RENDER_WORKERS):
+    # one WordprocessingML string per room, without the page break between rooms
+    shells = template.shells
+    jobs = [(room_name, date, time, grid.rolls, grid.depts, grid.papers,
+             grid.dominant_depts(), *shells.get(grid.cols))
+            for room_name, grid in plan]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            pages = list(pool.map(room_page_xml, *zip(*jobs), chunksize=chunksize))
+    else:
+        pages = [room_page_xml(*args) for args in jobs]
+    return pages
+
+def assemble_docx(template, pages):
+    return splice_pages(template.docx_bytes, template.partname, [PAGE_BREAK.join(pages)])
+
+def render_docx(template, plan, date, time, workers=RENDER_WORKERS):
+    if isinstance(template, bytes): template = Template(template)
+    return assemble_docx(template, render_pages(template, plan, date, time, workers))
@@ -0,0 +1,271 @@
+# jobs.py
+import asyncio, os, time, uuid, threading, multiprocessing, weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pipeline import (STAGES, PLAN_STORE, build_seating_plan, replan_seating_plan, plan_content,
+                      plan_key, cache_stats)
+from cache import ContentCache
+from mapping import InvalidMappingFile
+from metrics import Metrics, StageRecorder, max_rss_bytes
+
+MAX_WORKERS = int(os.environ.get("SEATING_MAX_WORKERS", os.cpu_count() or 1))
+MAX_JOBS = int(os.environ.get("SEATING_MAX_JOBS", 64))
+RESULT_TTL = float(os.environ.get("SEATING_RESULT_TTL", 15 * 60))
+
+class TooManyJobs(Exception):
+    pass
+
+def _run_job(kwargs, job_id=None, progress=None, trace_memory=False, profile=False):
+    report = None
+    if progress is not None:
+        def report(stage):
+            progress[job_id] = stage
+    recorder = StageRecorder(report, trace_memory, profile)
+    content = build_seating_plan(**kwargs, recorder=recorder)
+    return _outcome(content, recorder)
+
+def _run_patch(plan_id, delta, trace_memory=False, profile=False):
+    recorder = StageRecorder(None, trace_memory, profile)
+    content, summary = replan_seating_plan(plan_id, delta, recorder=recorder)
+    return {**_outcome(content, recorder), "plan": summary}
+
+def _outcome(content, recorder):
+    # stage timings and the worker's cache counters ride back with the result
+    # so the parent can publish them for work done in the pool processes
+    return {
+        "content": content,
+        "pid": os.getpid(),
+        "max_rss_bytes": max_rss_bytes(),
+        "cache": cache_stats(),
+        "stages": recorder.stages,
+        "profile": recorder.profile_dump(),
+    }
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"
+        self.created = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.stages = None
+
+    def to_dict(self, stage=None, ttl=RESULT_TTL):
+        done = self.status == "done"
+        completed = len(STAGES) if done else (STAGES.index(stage) if stage in STAGES else 0)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": None if done else stage,
+            "stages": STAGES,
+            "completed_stages": completed,
+            "error": self.error,
+            "timings": self.stages,
+            "created": self.created,
+            "finished": self.finished,
+            "expires": self.finished + ttl if self.finished else None,
+        }
+
+class JobManager:
+    # Plans run in a bounded process pool; at most max_jobs are tracked at a
+    # time (queued, running or holding a result, plus synchronous requests
+    # waiting on the pool) and finished results are dropped after ttl seconds.
+    def __init__(self, max_workers=MAX_WORKERS, max_jobs=MAX_JOBS, ttl=RESULT_TTL):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.jobs = {}
+        self.inflight = 0
+        self.lock = threading.Lock()
+        self.results = ContentCache("results")
+        self.worker_stats = {}
+        self.metrics = Metrics()
+        self.plan_locks = weakref.WeakValueDictionary()
+        self._executor = None
+        self._manager = None
+        self._progress = None
+
+    @property
+    def executor(self):
+        with self.lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _drop_executor(self, executor):
+        # a pool that lost a worker (e.g. OOM-killed) refuses all further
+        # work; forget it so the next submit starts a fresh one
+        with self.lock:
+            if self._executor is not executor: return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # broken by an earlier job; this one hasn't run yet, so retry it
+            self._drop_executor(executor)
+            executor = self.executor
+            future = executor.submit(fn, *args)
+        future.add_done_callback(lambda f: self._check_pool(executor, f))
+        return future
+
+    def _check_pool(self, executor, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._drop_executor(executor)
+
+    @contextmanager
+    def _slot(self):
+        # synchronous requests count against max_jobs too, so a burst is
+        # turned away instead of piling its uploads up in the pool's queue
+        self.evict()
+        with self.lock:
+            if len(self.jobs) + self.inflight >= self.max_jobs:
+                raise TooManyJobs(f"{len(self.jobs) + self.inflight} jobs already in progress")
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+    @property
+    def progress(self):
+        if self._progress is None:
+            self._manager = multiprocessing.Manager()
+            self._progress = self._manager.dict()
+        return self._progress
+
+    def _record(self, outcome, source):
+        self.worker_stats[outcome["pid"]] = outcome["cache"]
+        self.metrics.record(outcome["stages"], source, outcome["pid"], outcome["max_rss_bytes"])
+        return outcome
+
+    def _collect(self, key, outcome):
+        self._record(outcome, "generated")
+        # profiled runs still produce the normal ZIP, so it is safe to cache
+        self.results.put(key, outcome["content"])
+        return outcome
+
+    def _cached(self, key):
+        content = self.results.get(key)
+        if content is None: return None
+        self.metrics.record([], "cache")
+        return {"content": content, "stages": [], "profile": None, "cached": True}
+
+    async def generate(self, trace_memory=False, profile=False, **kwargs):
+        # returns the worker outcome: content, per-stage timings and, when
+        # asked for, a cProfile dump; profiling always recomputes the plan
+        key = plan_key(**kwargs)
+        outcome = None if profile else self._cached(key)
+        if outcome is None:
+            with self._slot():
+                future = self._submit(_run_job, kwargs, None, None, trace_memory, profile)
+                outcome = self._collect(key, await asyncio.wrap_future(future))
+        return outcome
+
+    async def create_plan(self, trace_memory=False, profile=False, **kwargs):
+        # like generate(), but always runs and keeps the plan for later patches
+        plan_id = uuid.uuid4().hex
+        with self._slot():
+            future = self._submit(_run_job, dict(kwargs, plan_id=plan_id), None, None, trace_memory, profile)
+            outcome = self._record(await asyncio.wrap_future(future), "planned")
+        self.results.put(plan_key(**kwargs), outcome["content"])
+        return {**outcome, "plan_id": plan_id}
+
+    async def patch_plan(self, plan_id, delta, trace_memory=False, profile=False):
+        # patches to one plan are applied one at a time, in arrival order
+        with self._slot():
+            async with self.plan_locks.setdefault(plan_id, asyncio.Lock()):
+                future = self._submit(_run_patch, plan_id, delta, trace_memory, profile)
+                return self._record(await asyncio.wrap_future(future), "patched")
+
+    async def plan_content(self, plan_id):
+        async with self.plan_locks.setdefault(plan_id, asyncio.Lock()):
+            return await asyncio.wrap_future(self._submit(plan_content, plan_id))
+
+    def delete_plan(self, plan_id):
+        PLAN_STORE.delete(plan_id)
+
+    def render_metrics(self):
+        return self.metrics.render(self.cache_stats())
+
+    def cache_stats(self):
+        stats = {"results": self.results.stats()}
+        for worker in list(self.worker_stats.values()):
+            for name, counters in worker.items():
+                total = stats.setdefault(name, dict.fromkeys(counters, 0))
+                for k, v in counters.items(): total[k] += v
+        return stats
+
+    def evict(self):
+        now = time.time()
+        with self.lock:
+            for job_id in [j.id for j in self.jobs.values() if j.finished and now - j.finished > self.ttl]:
+                self._forget(job_id)
+            finished = sorted((j for j in self.jobs.values() if j.finished), key=lambda j: j.finished)
+            while len(self.jobs) >= self.max_jobs and finished:
+                self._forget(finished.pop(0).id)
+
+    def _forget(self, job_id):
+        self.jobs.pop(job_id, None)
+        if self._progress is not None:
+            self._progress.pop(job_id, None)
+
+    def submit(self, **kwargs):
+        self.evict()
+        with self.lock:
+            if len(self.jobs) + self.inflight >= self.max_jobs:
+                raise TooManyJobs(f"{len(self.jobs) + self.inflight} jobs already in progress")
+            job = Job(uuid.uuid4().hex)
+            self.jobs[job.id] = job
+        key = plan_key(**kwargs)
+        outcome = self._cached(key)
+        if outcome is not None:
+            job.result, job.stages = outcome["content"], outcome["stages"]
+            job.status, job.finished = "done", time.time()
+            return job
+        try:
+            future = self._submit(_run_job, kwargs, job.id, self.progress)
+        except Exception:
+            # never started, so it must not hold a max_jobs slot
+            with self.lock:
+                self._forget(job.id)
+            raise
+        future.add_done_callback(lambda f: self._finish(job, key, f))
+        return job
+
+    def _finish(self, job, key, future):
+        try:
+            outcome = self._collect(key, future.result())
+            job.result, job.stages = outcome["content"], outcome["stages"]
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            # a bad upload is the client's fault, anything else is ours
+            job.error_status = 400 if isinstance(e, InvalidMappingFile) else 500
+            job.status = "failed"
+        job.finished = time.time()
+
+    def get(self, job_id):
+        self.evict()
+        return self.jobs.get(job_id)
+
+    def status(self, job):
+        stage = self._progress.get(job.id) if self._progress is not None else None
+        if job.status == "queued" and stage:
+            job.status = "running"
+        return job.to_dict(stage, self.ttl)
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = self._progress = None
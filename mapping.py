@@ -0,0 +1,181 @@
+# mapping.py
+import csv, io, zipfile
+import numpy as np
+import pandas as pd
+
+# A roll token is matched against a student's last 8 roll digits:
+#   20210042            exact (11-digit rolls are cut to their last 8)
+#   20210001..20210050  inclusive numeric range
+#   2021*               prefix
+# Exact matches beat ranges, ranges beat prefixes; the narrowest range and
+# the longest prefix win, and a repeated exact entry keeps the last one.
+RANGE_SEP = ".."
+PREFIX_MARK = "*"
+UNMAPPED_COLUMNS = ['Rollno', 'name', 'Paper Code']
+# per-paper offset that keeps every paper's last-8 values in its own band
+PAPER_STRIDE = 10 ** 9
+KEY_SEP = "\x1f"
+# hand-edited and Excel-exported CSVs are often not UTF-8; latin-1 always decodes
+CSV_ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")
+
+class InvalidMappingFile(ValueError):
+    pass
+
+def parse_mapping_input(mapping_input):
+    # "PAPER-token-token-DEPT, PAPER-token-DEPT, ..."
+    entries = []
+    for entry in (mapping_input or "").split(","):
+        parts = entry.strip().split("-")
+        if len(parts) < 3: continue
+        paper = parts[0].strip()
+        dept = parts[-1].strip()
+        for token in parts[1:-1]:
+            entries.append((paper, token.strip(), dept))
+    return entries
+
+def _cell(value):
+    if pd.isna(value): return ""
+    if isinstance(value, float) and value.is_integer(): value = int(value)
+    return str(value).strip()
+
+def _decode(content):
+    for encoding in CSV_ENCODINGS:
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+def _read_rows(content):
+    if content[:2] == b"PK":
+        try:
+            raw = pd.read_excel(io.BytesIO(content), sheet_name=0, header=None, dtype=object)
+        except (ValueError, KeyError, OSError, zipfile.BadZipFile) as e:
+            raise InvalidMappingFile(f"Mapping file is not a readable XLSX workbook ({e})") from e
+        return [[_cell(v) for v in row] for row in raw.itertuples(index=False)]
+    # the csv module keeps ragged rows as they are; short ones are skipped below
+    try:
+        return [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(_decode(content)))]
+    except csv.Error as e:
+        raise InvalidMappingFile(f"Mapping file is not a readable CSV ({e})") from e
+
+def read_mapping_file(content):
+    # CSV or XLSX with paper / roll token / department columns, found by
+    # header name when there is a header row and by position otherwise
+    rows = [row for row in _read_rows(content) if any(row)]
+    if not rows:
+        raise InvalidMappingFile("Mapping file is empty")
+
+    header = [h.lower() for h in rows[0]]
+    paper_col, roll_col, dept_col = 0, 1, 2
+    if any("paper" in h for h in header):
+        paper_col = next(i for i, h in enumerate(header) if "paper" in h)
+        dept_col = next((i for i, h in enumerate(header) if "dep" in h), 2)
+        roll_col = next((i for i, h in enumerate(header) if i not in (paper_col, dept_col)), 1)
+        rows = rows[1:]
+
+    entries = []
+    for row in rows:
+        if len(row) <= max(paper_col, roll_col, dept_col): continue
+        paper, token, dept = row[paper_col], row[roll_col], row[dept_col]
+        if paper and token and dept:
+            entries.append((paper, token, dept))
+    if not entries:
+        raise InvalidMappingFile("Mapping file has no rows with a paper code, roll number and department")
+    return entries
+
+def _last8(token):
+    token = token.strip()
+    if token.isdigit() and len(token) < 8: token = token.zfill(8)
+    return token[-8:]
+
+class MappingIndex:
+    def __init__(self, entries):
+        exact, prefixes, ranges = [], {}, {}
+        for paper, token, dept in entries:
+            if RANGE_SEP in token:
+                lo, hi = (t.strip() for t in token.split(RANGE_SEP, 1))
+                if not (lo[-8:].isdigit() and hi[-8:].isdigit()): continue
+                lo, hi = sorted((int(lo[-8:]), int(hi[-8:])))
+                ranges.setdefault(paper, []).append((lo, hi, dept))
+            elif token.endswith(PREFIX_MARK):
+                prefix = token.rstrip(PREFIX_MARK).strip()[-8:]
+                prefixes.setdefault(len(prefix), []).append((paper, prefix, dept))
+            elif token:
+                exact.append((paper, _last8(token), dept))
+
+        self.exact = self._lookup_table(exact)
+        self.prefixes = {n: self._lookup_table(rows) for n, rows in sorted(prefixes.items())}
+        self._build_ranges(ranges)
+
+    @staticmethod
+    def _lookup_table(rows):
+        # paper and key joined into one string so lookups are a single hash probe
+        table = {f"{paper}{KEY_SEP}{key}": dept for paper, key, dept in rows}
+        return pd.Index(list(table), dtype=object), np.array(list(table.values()), dtype=object)
+
+    def _build_ranges(self, ranges):
+        # cut each paper's ranges into disjoint segments labelled with the
+        # narrowest covering range, then lay papers out in separate bands so a
+        # single searchsorted resolves every student at once
+        self.range_papers = {p: i for i, p in enumerate(ranges)}
+        points, depts = [], []
+        for paper, items in ranges.items():
+            offset = self.range_papers[paper] * PAPER_STRIDE
+            pts = np.unique([v for lo, hi, _ in items for v in (lo, hi + 1)])
+            seg = np.full(len(pts), None, dtype=object)
+            for lo, hi, dept in sorted(items, key=lambda r: r[0] - r[1]):
+                seg[np.searchsorted(pts, lo):np.searchsorted(pts, hi + 1)] = dept
+            points.append(pts + offset)
+            depts.append(seg)
+        self.range_points = np.concatenate(points) if points else np.empty(0, dtype=np.int64)
+        self.range_depts = np.concatenate(depts) if depts else np.empty(0, dtype=object)
+
+    @property
+    def nbytes(self):
+        tables = [self.exact, *self.prefixes.values()]
+        return int(sum(keys.memory_usage(deep=True) + 64 * len(depts) for keys, depts in tables)
+                   + self.range_points.nbytes + 64 * len(self.range_depts))
+
+    def _from_table(self, table, papers, keys):
+        index, depts = table
+        out = np.full(len(papers), None, dtype=object)
+        if not len(index): return out
+        pos = index.get_indexer(papers + KEY_SEP + keys)
+        found = pos >= 0
+        out[found] = depts[pos[found]]
+        return out
+
+    def _from_ranges(self, papers, last8):
+        out = np.full(len(papers), None, dtype=object)
+        if not len(self.range_points): return out
+        band = papers.map(self.range_papers).to_numpy(dtype=float)
+        value = pd.to_numeric(last8, errors='coerce').to_numpy(dtype=float)
+        ok = ~np.isnan(band) & ~np.isnan(value)
+        keys = band[ok].astype(np.int64) * PAPER_STRIDE + value[ok].astype(np.int64)
+        idx = np.searchsorted(self.range_points, keys, side='right') - 1
+        hit = np.full(len(keys), None, dtype=object)
+        valid = idx >= 0
+        hit[valid] = self.range_depts[idx[valid]]
+        out[ok] = hit
+        return out
+
+    def lookup(self, df):
+        papers, last8 = df['Paper Code'], df['last8']
+        dept = np.full(len(df), None, dtype=object)
+        layers = [self._from_table(table, papers, last8.str[:n]) for n, table in self.prefixes.items()]
+        layers += [self._from_ranges(papers, last8), self._from_table(self.exact, papers, last8)]
+        for layer in layers:
+            found = pd.notna(layer)
+            dept[found] = layer[found]
+        return dept
+
+def build_index(mapping_input="", mapping_bytes=None):
+    entries = read_mapping_file(mapping_bytes) if mapping_bytes else []
+    return MappingIndex(entries + parse_mapping_input(mapping_input))
+
+def assign_departments(df, index):
+    # returns (mapped students with a 'department' column, unmapped students)
+    df = df.copy()
+    df['department'] = index.lookup(df)
+    mapped = df['department'].notna()
+    return df[mapped], df.loc[~mapped, UNMAPPED_COLUMNS]
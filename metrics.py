@@ -0,0 +1,154 @@
+# metrics.py
+import cProfile, marshal, os, sys, threading, time, tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ITEM_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+MEMORY_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(0, 13))  # 1 MiB .. 4 GiB
+OUTPUT_BUCKETS = tuple(2 ** n * 64 * 1024 for n in range(0, 15))   # 64 KiB .. 1 GiB
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def max_rss_bytes():
+    # the process's peak over its whole lifetime
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def rss_bytes():
+    # current resident memory; only Linux exposes it without extra packages
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StageRecorder:
+    # Times each pipeline stage and records how many rows/seats it handled.
+    # trace_memory adds a tracemalloc peak per stage and profile wraps the
+    # whole run in cProfile; both are opt-in because they slow the run down.
+    def __init__(self, progress=None, trace_memory=False, profile=False):
+        self.progress = progress
+        self.trace_memory = trace_memory
+        self.profiler = cProfile.Profile() if profile else None
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        if self.progress: self.progress(name)
+        record = {"stage": name, "items": None}
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        if self.profiler: self.profiler.enable()
+        rss = rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.profiler: self.profiler.disable()
+            if self.trace_memory:
+                record["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            end = rss_bytes()
+            # how much resident memory the stage itself added (0 if it shrank)
+            record["rss_growth_bytes"] = max(0, end - rss) if rss is not None and end is not None else None
+            self.stages.append(record)
+
+    def profile_dump(self):
+        # same format as pstats.Stats.dump_stats, loadable with pstats/snakeviz
+        if self.profiler is None: return None
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+def _labels(names, values):
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+class Histogram:
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+
+    def observe(self, value, *labels):
+        if value is None: return
+        counts, total = self.series.setdefault(labels, ([0] * len(self.buckets), [0, 0.0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound: counts[i] += 1
+        total[0] += 1
+        total[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, (count, total)) in sorted(self.series.items()):
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (bound,))} {n}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_seconds = Histogram(
+            "seating_stage_seconds", "Wall time of each plan generation stage.",
+            SECONDS_BUCKETS, ("stage",))
+        self.stage_items = Histogram(
+            "seating_stage_items",
+            "Rows or seats handled by each stage (roster rows, mapped students, seats placed).",
+            ITEM_BUCKETS, ("stage",))
+        self.stage_output = Histogram(
+            "seating_stage_output_bytes", "Bytes written by the zip and save stages.",
+            OUTPUT_BUCKETS, ("stage",))
+        self.stage_rss = Histogram(
+            "seating_stage_rss_growth_bytes", "Resident memory added by each stage in its worker.",
+            MEMORY_BUCKETS, ("stage",))
+        self.stage_traced = Histogram(
+            "seating_stage_traced_peak_bytes", "Peak Python allocations per stage, for requests traced with ?timings=1.",
+            MEMORY_BUCKETS, ("stage",))
+        self.requests = {}
+        self.worker_rss = {}
+
+    def record(self, stages, source, pid=None, max_rss=None):
+        with self.lock:
+            for s in stages:
+                self.stage_seconds.observe(s["seconds"], s["stage"])
+                self.stage_items.observe(s["items"], s["stage"])
+                self.stage_output.observe(s.get("bytes"), s["stage"])
+                self.stage_rss.observe(s.get("rss_growth_bytes"), s["stage"])
+                self.stage_traced.observe(s.get("traced_peak_bytes"), s["stage"])
+            self.requests[source] = self.requests.get(source, 0) + 1
+            if pid is not None and max_rss is not None:
+                self.worker_rss[pid] = max_rss
+
+    def render(self, cache_stats=None):
+        with self.lock:
+            lines = (self.stage_seconds.render() + self.stage_items.render() + self.stage_output.render()
+                     + self.stage_rss.render() + self.stage_traced.render())
+            lines += ["# HELP seating_plans_total Plans served, by where the result came from.",
+                      "# TYPE seating_plans_total counter"]
+            lines += [f'seating_plans_total{{source="{k}"}} {v}' for k, v in sorted(self.requests.items())]
+            lines += ["# HELP seating_worker_max_rss_bytes Lifetime peak resident memory of each pool worker.",
+                      "# TYPE seating_worker_max_rss_bytes gauge"]
+            lines += [f'seating_worker_max_rss_bytes{{pid="{k}"}} {v}' for k, v in sorted(self.worker_rss.items())]
+        for field in ("hits", "misses", "disk_hits", "evictions"):
+            name = f"seating_cache_{field}_total"
+            lines += [f"# HELP {name} Content cache {field.replace('_', ' ')}.", f"# TYPE {name} counter"]
+            lines += [f'{name}{{cache="{cache}"}} {s[field]}' for cache, s in sorted((cache_stats or {}).items())]
+        for field in ("items", "bytes"):
+            name = f"seating_cache_{field}"
+            lines += [f"# HELP {name} Content cache {field} held in memory.", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{cache="{cache}"}} {s[field]}' for cache, s in sorted((cache_stats or {}).items())]
+        return "\n".join(lines) + "\n"
+
+def server_timing(stages):
+    return ", ".join(f'{s["stage"]};dur={s["seconds"] * 1000:.1f}' for s in stages)
@@ -0,0 +1,198 @@
+# pipeline.py
+import zipfile, io
+from roster import parse_roster_files, concat_rosters
+from mapping import build_index, assign_departments
+from allocator import allocate
+from docx_renderer import Template, render_pages, assemble_docx
+from xlsx_writer import render_workbook, read_sheets
+from cache import ContentCache, digest
+from metrics import StageRecorder
+from plans import PlanState, PlanStore, InvalidDelta, edit_rooms, pack_page, unpack_page, room_fingerprint
+
+DOCX_NAME = "Seating_Plan_All_Rooms.docx"
+XLSX_NAME = "Seating_Summary.xlsx"
+UNMAPPED_NAME = "Unmapped_Students.csv"
+STAGES = ["parse", "map", "allocate", "render_docx", "render_xlsx", "zip"]
+ROSTER_CACHE = ContentCache("rosters")
+TEMPLATE_CACHE = ContentCache("templates")
+MAPPING_CACHE = ContentCache("mappings")
+PLAN_STORE = PlanStore()
+
+PALETTE = ["F8CBAD", "DDEBF7", "C6E0B4", "F4B084", "FFD966", "D9D2E9", "B4C6E7", "E2EFDA"]
+
+def save_to_bytes(document):
+    buf = io.BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+def build_zip(docx_bytes, xlsx_bytes, unmapped=None):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zipf:
+        zipf.writestr(DOCX_NAME, docx_bytes)
+        zipf.writestr(XLSX_NAME, xlsx_bytes)
+        # students no mapping entry matched are listed rather than dropped silently
+        if unmapped is not None and len(unmapped):
+            zipf.writestr(UNMAPPED_NAME, unmapped.to_csv(index=False))
+    return buf.getvalue()
+
+def parse_layout(layout):
+    rows, cols = map(int, layout.lower().split("x"))
+    return rows, cols
+
+def parse_room_specs(room_specs):
+    parsed_rooms = []
+    for spec in room_specs.split(","):
+        parts = spec.strip().split(":")
+        name = parts[0]
+        layout = parts[2] if len(parts) == 3 else "6x8"
+        parsed_rooms.append((name, *parse_layout(layout)))
+    return parsed_rooms
+
+def load_rosters(excel_contents):
+    keys = [digest(content) for content in excel_contents]
+    frames = {key: ROSTER_CACHE.get(key) for key in keys}
+    missing = {key: content for key, content in zip(keys, excel_contents) if frames[key] is None}
+    for key, df in zip(missing, parse_roster_files(list(missing.values()))):
+        frames[key] = ROSTER_CACHE.put(key, df)
+    return concat_rosters([frames[key] for key in keys])
+
+def load_template(template_bytes):
+    return TEMPLATE_CACHE.get_or_set(digest(template_bytes), lambda: Template(template_bytes))
+
+def load_mapping(mapping_input, mapping_bytes=None):
+    key = digest(mapping_input, digest(mapping_bytes or b""))
+    return MAPPING_CACHE.get_or_set(key, lambda: build_index(mapping_input, mapping_bytes))
+
+def plan_key(excel_contents, template_bytes, mapping_input, room_specs, date, time, count_sheets=False,
+             mapping_bytes=None):
+    # hashes of the uploads rather than the uploads themselves, in upload order
+    return digest(*[digest(c) for c in excel_contents], digest(template_bytes),
+                  mapping_input, room_specs, date, time, count_sheets, digest(mapping_bytes or b""))
+
+def paper_palette(papers):
+    return {p: PALETTE[i % len(PALETTE)] for i, p in enumerate(papers)}
+
+def cache_stats():
+    return {"rosters": ROSTER_CACHE.stats(), "templates": TEMPLATE_CACHE.stats(),
+            "mappings": MAPPING_CACHE.stats()}
+
+def build_seating_plan(excel_contents, template_bytes, mapping_input, room_specs, date, time,
+                       count_sheets=False, mapping_bytes=None, plan_id=None, recorder=None):
+    # runs every stage synchronously and returns the ZIP bytes; the recorder
+    # reports progress and collects per-stage timings. With a plan_id the
+    # allocation state and rendered pages are kept for replan_seating_plan.
+    recorder = recorder or StageRecorder()
+
+    with recorder.stage("parse") as st:
+        df = load_rosters(excel_contents)
+        st["items"] = len(df)
+
+    with recorder.stage("map") as st:
+        df, unmapped = assign_departments(df, load_mapping(mapping_input, mapping_bytes))
+        st["items"] = len(df)
+        st["unmapped"] = len(unmapped)
+
+    with recorder.stage("allocate") as st:
+        parsed_rooms = parse_room_specs(room_specs)
+        paper_groups = {p: list(zip(g['Rollno'], g['department'])) for p, g in df.groupby('Paper Code', sort=False)}
+        allocator, plan = allocate(parsed_rooms, paper_groups)
+        paper_colors = paper_palette(allocator.papers)
+        seats = sum(grid.occupied for _, grid in plan)
+        st["items"] = seats
+
+    with recorder.stage("render_docx") as st:
+        template = load_template(template_bytes)
+        pages = render_pages(template, plan, date, time)
+        docx_bytes = assemble_docx(template, pages)
+        st["items"] = seats
+
+    with recorder.stage("render_xlsx") as st:
+        xlsx_bytes, room_counts = render_workbook(plan, paper_colors, count_sheets)
+        st["items"] = seats
+
+    with recorder.stage("zip") as st:
+        content = build_zip(docx_bytes, xlsx_bytes, unmapped)
+        st["bytes"] = len(content)
+
+    if plan_id is not None:
+        with recorder.stage("save") as st:
+            state = PlanState(allocator, plan, parsed_rooms, [pack_page(p) for p in pages],
+                              [room_fingerprint(name, grid) for name, grid in plan],
+                              template_bytes, date, time, count_sheets, unmapped, xlsx_bytes, room_counts)
+            st["bytes"] = PLAN_STORE.save(plan_id, state)
+    return content
+
+def replan_seating_plan(plan_id, delta, recorder=None):
+    # Applies a delta to a stored plan: rooms removed, added or given a new
+    # layout, students added (already mapped to a department) or removed.
+    # Allocation resumes from the first room the delta can affect and only
+    # rooms whose seating changed are rendered again. Returns the ZIP bytes
+    # and a summary of what was redone.
+    recorder = recorder or StageRecorder()
+
+    with recorder.stage("load") as st:
+        state = PLAN_STORE.load(plan_id)
+        st["items"] = len(state.rolls)
+
+    with recorder.stage("allocate") as st:
+        try:
+            layouts = {name: parse_layout(layout) for name, layout in (delta.get("layouts") or {}).items()}
+            add_rooms = parse_room_specs(delta["add_rooms"]) if delta.get("add_rooms") else []
+        except ValueError:
+            raise InvalidDelta("Layouts must look like 6x8 and rooms like name:capacity:6x8")
+        rooms, first_room = edit_rooms(state.rooms, delta.get("remove_rooms") or [], layouts, add_rooms)
+        add_students = [(s["rollno"], s["paper_code"], s["department"]) for s in delta.get("add_students") or []]
+        allocator, plan, first = state.replan(rooms, first_room, add_students, delta.get("remove_students") or [])
+        paper_colors = paper_palette(allocator.papers)
+        seats = sum(grid.occupied for _, grid in plan)
+        st["items"] = seats
+        st["first_room"] = first
+
+    with recorder.stage("render_docx") as st:
+        template = load_template(state.template_bytes)
+        matches, prints = state.match_rooms(plan, first)
+        stale = [i for i, old in enumerate(matches) if old is None]
+        pages = [None if old is None else state.pages[old] for old in matches]
+        fresh = render_pages(template, [plan[i] for i in stale], state.date, state.time)
+        for i, page in zip(stale, fresh):
+            pages[i] = pack_page(page)
+        docx_bytes = assemble_docx(template, [unpack_page(p) for p in pages])
+        st["items"] = sum(plan[i][1].occupied for i in stale)
+        st["rooms"] = len(stale)
+
+    with recorder.stage("render_xlsx") as st:
+        # sheet XML only refers to per-paper style ids, which stay put while
+        # the stored papers keep their order (and so their colours)
+        sheets = {}
+        if allocator.papers[:len(state.papers)] == state.papers:
+            kept = {i: old for i, old in enumerate(matches) if old is not None}
+            stored = read_sheets(state.xlsx_bytes, set(kept.values()))
+            sheets = {i: (stored[old], state.room_counts[old]) for i, old in kept.items()}
+        xlsx_bytes, room_counts = render_workbook(plan, paper_colors, state.count_sheets, sheets)
+        st["items"] = sum(grid.occupied for i, (_, grid) in enumerate(plan) if i not in sheets)
+        st["rooms"] = len(plan) - len(sheets)
+
+    with recorder.stage("zip") as st:
+        content = build_zip(docx_bytes, xlsx_bytes, state.unmapped)
+        st["bytes"] = len(content)
+
+    with recorder.stage("save") as st:
+        state = PlanState(allocator, plan, rooms, pages, prints, state.template_bytes,
+                          state.date, state.time, state.count_sheets, state.unmapped, xlsx_bytes, room_counts)
+        st["bytes"] = PLAN_STORE.save(plan_id, state)
+
+    # first_room is None when no room was allocated again (e.g. the delta
+    # only touched unmapped students or rooms past the last filled one)
+    summary = {
+        "first_room": plan[first][0] if first < len(plan) else None,
+        "rooms": len(plan),
+        "rerendered": [plan[i][0] for i in stale],
+    }
+    return content, summary
+
+def plan_content(plan_id):
+    # the ZIP for a stored plan, reassembled from its pages and workbook
+    state = PLAN_STORE.load(plan_id)
+    template = load_template(state.template_bytes)
+    docx_bytes = assemble_docx(template, [unpack_page(p) for p in state.pages])
+    return build_zip(docx_bytes, state.xlsx_bytes, state.unmapped)
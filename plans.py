@@ -0,0 +1,280 @@
+# plans.py
+import json, os, re, tempfile, time, zlib
+from collections import Counter
+import numpy as np
+import pandas as pd
+from allocator import SeatAllocator, RoomGrid, HIGH_PAPER_SIZE
+from cache import digest, private_dir
+
+PLAN_DIR = os.environ.get("SEATING_PLAN_DIR") or os.path.join(
+    tempfile.gettempdir(), f"seating-plans-{os.getuid() if hasattr(os, 'getuid') else 'user'}")
+PLAN_TTL = float(os.environ.get("SEATING_PLAN_TTL", 7 * 24 * 60 * 60))
+PLAN_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+class PlanNotFound(Exception):
+    pass
+
+class InvalidDelta(ValueError):
+    pass
+
+def pack_page(xml):
+    return zlib.compress(xml.encode("utf-8"), 1)
+
+def unpack_page(data):
+    return zlib.decompress(data).decode("utf-8")
+
+def room_fingerprint(name, grid):
+    # everything a room page is rendered from, besides the plan-wide date/time
+    return digest(name, repr(grid.rolls), repr(grid.depts), repr(grid.papers))
+
+def edit_rooms(rooms, remove=(), layouts=None, add=()):
+    # returns the edited room list and the index of the first room that
+    # differs from the old list (None when nothing changed)
+    layouts = layouts or {}
+    names = [name for name, _, _ in rooms]
+    unknown = [name for name in [*remove, *layouts] if name not in names]
+    if unknown:
+        raise InvalidDelta(f"Unknown rooms: {', '.join(unknown)}")
+    taken = [name for name, _, _ in add if name in names and name not in remove]
+    if taken:
+        raise InvalidDelta(f"Rooms already in the plan: {', '.join(taken)}")
+
+    edited, first = [], len(rooms) if add else None
+    for i, (name, rows, cols) in enumerate(rooms):
+        layout = layouts.get(name, (rows, cols))
+        if name not in remove:
+            edited.append((name, *layout))
+        if name in remove or layout != (rows, cols):
+            first = i if first is None else min(first, i)
+    return edited + list(add), first
+
+class PlanState:
+    # What PATCH /plans/{id} needs to resume allocation from any room and to
+    # reassemble the ZIP without re-rendering untouched rooms: the students
+    # in allocator order, a checkpoint before every room (plus one after the
+    # last), each room's int32 seat/paper grids and its compressed page XML,
+    # and each room's (paper, department) counts for the count sheets.
+    def __init__(self, allocator, plan, rooms, pages, fingerprints, template_bytes,
+                 date, time, count_sheets, unmapped, xlsx_bytes, room_counts):
+        self.papers = list(allocator.papers)
+        self.offsets = allocator.offsets
+        self.rolls = allocator.rolls
+        self.depts = allocator.depts
+        self.checkpoints = allocator.checkpoints[:len(plan)] + [allocator.snapshot()]
+        self.rooms = list(rooms)
+        self.grids = [(name, grid.seat, grid.paper) for name, grid in plan]
+        self.pages = list(pages)
+        self.fingerprints = list(fingerprints)
+        self.template_bytes = template_bytes
+        self.date = date
+        self.time = time
+        self.count_sheets = count_sheets
+        self.unmapped = unmapped
+        self.xlsx_bytes = xlsx_bytes
+        self.room_counts = list(room_counts)
+
+    def edit_students(self, add=(), remove=()):
+        # add: (rollno, paper, department) appended to their paper;
+        # remove: roll numbers. Returns the new paper groups and, per paper
+        # index, the first position within the paper that changed.
+        remove = set(remove)
+        drop = np.isin(self.rolls, list(remove)) if remove else np.zeros(len(self.rolls), dtype=bool)
+        dropped_unmapped = self.unmapped['Rollno'].isin(remove)
+        unknown = remove - set(self.rolls[drop]) - set(self.unmapped.loc[dropped_unmapped, 'Rollno'])
+        if unknown:
+            raise InvalidDelta(f"Unknown students: {', '.join(sorted(unknown))}")
+
+        changed = {}
+        for i in np.flatnonzero(drop):
+            k = int(np.searchsorted(self.offsets, i, side='right')) - 1
+            changed[k] = min(changed.get(k, i - self.offsets[k]), i - self.offsets[k])
+
+        groups = {}
+        for k, paper in enumerate(self.papers):
+            lo, hi = self.offsets[k], self.offsets[k + 1]
+            keep = ~drop[lo:hi]
+            groups[paper] = list(zip(self.rolls[lo:hi][keep], self.depts[lo:hi][keep]))
+
+        for roll, paper, dept in add:
+            group = groups.setdefault(paper, [])
+            if any(r == roll for r, _ in group):
+                raise InvalidDelta(f"Student {roll} is already on paper {paper}")
+            if paper in self.papers:
+                k = self.papers.index(paper)
+                changed.setdefault(k, int(self.offsets[k + 1] - self.offsets[k]))
+            group.append((roll, dept))
+
+        # students that were listed as unmapped and now have a department, or
+        # were removed, leave the unmapped report
+        added = {roll for roll, _, _ in add}
+        self.unmapped = self.unmapped[~dropped_unmapped & ~self.unmapped['Rollno'].isin(added)]
+        return groups, changed
+
+    def first_affected(self, changed, new_papers):
+        # Room r comes out the same when, at the checkpoint after it, every
+        # changed paper has seated fewer students than its first changed
+        # position, or has seated none and is still behind the first two
+        # papers in the queue. Papers new to the plan sit at the queue's end.
+        for r in range(len(self.grids)):
+            seated, queue = self.checkpoints[r + 1]
+            position = {k: i for i, k in enumerate(queue)}
+            for k, c in changed.items():
+                if seated[k] >= c and not (seated[k] == 0 and position.get(k, 0) >= 2):
+                    return r
+            if new_papers and len(queue) < 2:
+                return r
+        return len(self.grids)
+
+    def replan(self, rooms, first_room=None, add_students=(), remove_students=()):
+        # returns the new allocator, its plan and the index of the first room
+        # that was allocated again; rooms before it keep their seats
+        groups, changed = self.edit_students(add_students, remove_students)
+        allocator = SeatAllocator(groups, HIGH_PAPER_SIZE)
+        first = len(self.grids) if first_room is None else min(first_room, len(self.grids))
+        if allocator.papers[:len(self.papers)] != self.papers:
+            first = 0  # the paper order changed, so every room changes
+        elif changed or len(allocator.papers) > len(self.papers):
+            first = min(first, self.first_affected(changed, len(allocator.papers) > len(self.papers)))
+
+        plan = []
+        if first:
+            # seat indices move with their paper's offset (the appended 0 is
+            # for empty seats, whose paper index is -1) and papers new to the
+            # plan join the end of every queue
+            shift = np.append(allocator.offsets[:len(self.papers)] - self.offsets[:-1], 0)
+            for name, seat, paper in self.grids[:first]:
+                moved = np.where(seat >= 0, seat + shift[paper], -1).astype(np.int32)
+                plan.append((name, RoomGrid(allocator, moved, paper)))
+            new = list(range(len(self.papers), len(allocator.papers)))
+            pad = np.zeros(len(new), dtype=np.int32)
+            allocator.checkpoints = [(np.concatenate([s, pad]), q + new) for s, q in self.checkpoints[:first + 1]]
+            allocator.restore(*allocator.checkpoints.pop())
+        for name, rows, cols in rooms[first:]:
+            if not allocator.queue: break
+            plan.append((name, allocator.fill_room(rows, cols)))
+        return allocator, plan, first
+
+    def match_rooms(self, plan, first):
+        # for each room of the new plan, the index of a stored room that
+        # renders identically (or None), and the room's fingerprint
+        stored = {fp: i for i, fp in enumerate(self.fingerprints)}
+        matches, prints = list(range(first)), list(self.fingerprints[:first])
+        for name, grid in plan[first:]:
+            fp = room_fingerprint(name, grid)
+            matches.append(stored.get(fp))
+            prints.append(fp)
+        return matches, prints
+
+    def to_arrays(self):
+        # plain arrays plus a JSON header, so loading never unpickles anything
+        meta = {
+            "papers": self.papers,
+            "queues": [queue for _, queue in self.checkpoints],
+            "rooms": self.rooms,
+            "grids": [(name, *seat.shape) for name, seat, _ in self.grids],
+            "fingerprints": self.fingerprints,
+            "date": self.date,
+            "time": self.time,
+            "count_sheets": self.count_sheets,
+            "unmapped": self.unmapped.to_dict("list"),
+            "room_counts": [[[paper, dept, n] for (paper, dept), n in counts.items()]
+                            for counts in self.room_counts],
+        }
+        seated = [s for s, _ in self.checkpoints]
+        return {
+            "meta": _blob(json.dumps(meta).encode("utf-8")),
+            "offsets": self.offsets,
+            "rolls": np.array(self.rolls.tolist(), dtype=str),
+            "depts": np.array(self.depts.tolist(), dtype=str),
+            "seated": np.array(seated, dtype=np.int32).reshape(len(seated), len(self.papers)),
+            "seats": _flat([seat for _, seat, _ in self.grids]),
+            "seat_papers": _flat([paper for _, _, paper in self.grids]),
+            "page_sizes": np.array([len(p) for p in self.pages], dtype=np.int64),
+            "pages": _blob(b"".join(self.pages)),
+            "template": _blob(self.template_bytes),
+            "xlsx": _blob(self.xlsx_bytes),
+        }
+
+    @classmethod
+    def from_arrays(cls, data):
+        meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        state = cls.__new__(cls)
+        state.papers = meta["papers"]
+        state.offsets = data["offsets"].astype(np.int64)
+        state.rolls = data["rolls"].astype(object)
+        state.depts = data["depts"].astype(object)
+        state.checkpoints = list(zip(data["seated"], meta["queues"]))
+        state.rooms = [tuple(room) for room in meta["rooms"]]
+        state.grids, at = [], 0
+        seats, papers = data["seats"], data["seat_papers"]
+        for name, rows, cols in meta["grids"]:
+            n = rows * cols
+            state.grids.append((name, seats[at:at + n].reshape(rows, cols), papers[at:at + n].reshape(rows, cols)))
+            at += n
+        pages, ends = data["pages"].tobytes(), np.cumsum(data["page_sizes"])
+        state.pages = [pages[end - size:end] for end, size in zip(ends, data["page_sizes"])]
+        state.fingerprints = meta["fingerprints"]
+        state.template_bytes = data["template"].tobytes()
+        state.date = meta["date"]
+        state.time = meta["time"]
+        state.count_sheets = meta["count_sheets"]
+        state.unmapped = pd.DataFrame(meta["unmapped"], dtype=object)
+        state.xlsx_bytes = data["xlsx"].tobytes()
+        state.room_counts = [Counter({(paper, dept): n for paper, dept, n in counts})
+                             for counts in meta["room_counts"]]
+        return state
+
+def _blob(data):
+    return np.frombuffer(data, dtype=np.uint8)
+
+def _flat(grids):
+    return np.concatenate([g.ravel() for g in grids]).astype(np.int32) if grids else np.empty(0, dtype=np.int32)
+
+class PlanStore:
+    # one compressed .npz per plan in a private local directory, shared by
+    # every worker process; plans not touched for ttl seconds are pruned on save
+    def __init__(self, directory=PLAN_DIR, ttl=PLAN_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, plan_id):
+        if not PLAN_ID_RE.match(plan_id or ""):
+            raise PlanNotFound(plan_id)
+        return os.path.join(private_dir(self.directory), f"{plan_id}.npz")
+
+    def save(self, plan_id, state):
+        path = self.path(plan_id)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **state.to_arrays())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.unlink(tmp)
+        self.prune()
+        return os.path.getsize(path)
+
+    def load(self, plan_id):
+        path = self.path(plan_id)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                state = PlanState.from_arrays(data)
+            os.utime(path)
+            return state
+        except FileNotFoundError:
+            raise PlanNotFound(plan_id)
+
+    def delete(self, plan_id):
+        try:
+            os.unlink(self.path(plan_id))
+        except FileNotFoundError:
+            raise PlanNotFound(plan_id)
+
+    def prune(self):
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".npz") and now - entry.stat().st_mtime > self.ttl:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,81 @@
+# roster.py
+import io, os, re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+ROSTER_COLUMNS = ['Rollno', 'name', 'Paper Code', 'last8']
+PAPER_CODE_RE = re.compile(r"Paper Code:\s*([A-Z0-9]+)")
+ROLL_COL, NAME_COL = 3, 5
+# plans already run inside the job pool, so parsing files in a pool of its
+# own is opt-in
+PARSE_WORKERS = int(os.environ.get("SEATING_PARSE_WORKERS", 1))
+
+def _is_number(col):
+    if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        return col.notna().to_numpy()
+    # object columns keep the python values openpyxl produced, so match the
+    # old isinstance(roll, (int, float)) check on the value types only
+    return col.map(lambda v: isinstance(v, (int, float)) and pd.notna(v)).to_numpy(dtype=bool)
+
+def find_blocks(df_raw):
+    # returns (paper_code, start, stop) for every student block, scanning the
+    # same way the row-by-row loop did but only touching block boundaries
+    first = df_raw[0]
+    is_text = first.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    text = first.where(is_text, "").astype(str)
+    headers = np.flatnonzero(is_text & text.str.contains("Paper ID", regex=False).to_numpy()
+                             & text.str.contains("Paper Code", regex=False).to_numpy())
+    rollno_rows = np.flatnonzero((df_raw[ROLL_COL].astype(str).str.strip().str.lower() == "rollno").to_numpy())
+    breaks = np.flatnonzero(~_is_number(df_raw[ROLL_COL]))
+
+    blocks = []
+    pos = 0
+    n = len(df_raw)
+    for h in headers:
+        if h < pos: continue
+        i = np.searchsorted(rollno_rows, h)
+        if i == len(rollno_rows): break
+        start = rollno_rows[i] + 1
+        j = np.searchsorted(breaks, start)
+        stop = breaks[j] if j < len(breaks) else n
+        match = PAPER_CODE_RE.search(text.iat[h])
+        blocks.append((match.group(1).strip() if match else "UNKNOWN", start, stop))
+        pos = stop
+    return blocks
+
+def parse_roster(content):
+    df_raw = pd.read_excel(io.BytesIO(content), sheet_name=0, header=None)
+    df_raw = df_raw.reindex(columns=range(max(NAME_COL + 1, df_raw.shape[1])))
+    blocks = find_blocks(df_raw)
+    if not blocks:
+        return pd.DataFrame(columns=ROSTER_COLUMNS)
+
+    take = np.concatenate([np.arange(start, stop) for _, start, stop in blocks])
+    papers = np.repeat([p for p, _, _ in blocks], [stop - start for _, start, stop in blocks])
+    rolls = pd.to_numeric(df_raw[ROLL_COL].iloc[take]).astype('int64').astype(str).str.zfill(11)
+    names = df_raw[NAME_COL].iloc[take]
+    names = names.where(names.notna(), "").astype(str).str.strip()
+
+    df = pd.DataFrame({
+        'Rollno': rolls.to_numpy(),
+        'name': names.to_numpy(),
+        'Paper Code': papers.astype(object),
+    })
+    df['last8'] = df['Rollno'].str[-8:]
+    return df
+
+def parse_roster_files(contents, max_workers=PARSE_WORKERS):
+    max_workers = min(len(contents), max_workers)
+    if max_workers <= 1 or len(contents) <= 1:
+        return [parse_roster(c) for c in contents]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(parse_roster, contents))
+
+def concat_rosters(frames):
+    if not frames:
+        return pd.DataFrame(columns=ROSTER_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def parse_rosters(contents, max_workers=PARSE_WORKERS):
+    return concat_rosters(parse_roster_files(contents, max_workers))
@@ -0,0 +1,55 @@
+# tests/test_allocator.py
+import random
+from allocator import allocate, HIGH_PAPER_SIZE
+
+def fill_columnwise(paper_queue, paper_groups, rows, cols):
+    # the list-based filler the allocator replaced, kept as the oracle
+    room = [["" for _ in range(cols)] for _ in range(rows)]
+    dept_map = [["" for _ in range(cols)] for _ in range(rows)]
+    paper_map = [["" for _ in range(cols)] for _ in range(rows)]
+    seat_order = [(r, c) for c in range(cols) for r in range(rows)]
+    seat_index = 0
+    while seat_index < len(seat_order) and paper_queue:
+        p1 = paper_queue[0]
+        p2 = paper_queue[1] if len(paper_queue) > 1 else None
+        for i in range(seat_index, len(seat_order)):
+            r, c = seat_order[i]
+            current_paper = None
+            if c % 2 == 0 and paper_groups[p1]: current_paper = p1
+            elif c % 2 == 1 and p2 and paper_groups[p2]: current_paper = p2
+            if current_paper:
+                roll, dept = paper_groups[current_paper].pop(0)
+                room[r][c] = roll
+                dept_map[r][c] = dept
+                paper_map[r][c] = current_paper
+                seat_index += 1
+                if not paper_groups[current_paper]: paper_queue.remove(current_paper)
+                break
+            else:
+                seat_index += 1
+    return room, dept_map, paper_map
+
+def reference_plan(rooms, groups):
+    groups = {paper: list(students) for paper, students in groups.items()}
+    queue = ([p for p in groups if len(groups[p]) >= HIGH_PAPER_SIZE]
+             + [p for p in groups if len(groups[p]) < HIGH_PAPER_SIZE])
+    plan = []
+    for name, rows, cols in rooms:
+        if not any(groups.values()): break
+        plan.append((name, fill_columnwise(queue, groups, rows, cols)))
+    return plan
+
+def random_case(rnd):
+    # sizes straddle HIGH_PAPER_SIZE so both halves of the queue get exercised
+    groups = {f"P{i}": [(f"r{i}_{j}", f"D{rnd.randint(0, 2)}")
+                        for j in range(rnd.choice([1, 2, 3, 5, 9, 10, 11, 30, 60]))]
+              for i in range(rnd.randint(1, 7))}
+    rooms = [(f"R{k}", rnd.randint(1, 7), rnd.randint(1, 9)) for k in range(rnd.randint(1, 8))]
+    return rooms, groups
+
+def test_allocate_matches_fill_columnwise():
+    for case in range(3000):
+        rooms, groups = random_case(random.Random(case))
+        _, plan = allocate(rooms, groups)
+        got = [(name, (grid.rolls, grid.depts, grid.papers)) for name, grid in plan]
+        assert got == reference_plan(rooms, groups), f"case {case}"
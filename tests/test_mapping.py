@@ -0,0 +1,115 @@
+# tests/test_mapping.py
+import io, random
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from mapping import (RANGE_SEP, PREFIX_MARK, InvalidMappingFile, MappingIndex, assign_departments,
+                     build_index, parse_mapping_input, read_mapping_file)
+
+def reference_dept(entries, paper, last8):
+    # the precedence rules spelled out one student at a time
+    exact, ranges, prefixes = [], [], []
+    for i, (p, token, dept) in enumerate(entries):
+        if p != paper: continue
+        if RANGE_SEP in token:
+            lo, hi = sorted(int(t.strip()[-8:]) for t in token.split(RANGE_SEP, 1))
+            if lo <= int(last8) <= hi:
+                ranges.append((hi - lo, -i, dept))
+        elif token.endswith(PREFIX_MARK):
+            prefix = token.rstrip(PREFIX_MARK)[-8:]
+            if last8.startswith(prefix):
+                prefixes.append((-len(prefix), -i, dept))
+        elif (token.zfill(8) if token.isdigit() else token)[-8:] == last8:
+            exact.append(dept)
+    if exact: return exact[-1]
+    if ranges: return min(ranges)[2]
+    if prefixes: return min(prefixes)[2]
+    return None
+
+def random_token(rnd, base):
+    kind = rnd.random()
+    value = f"{base}{rnd.randint(0, 60):04d}"
+    if kind < .3:
+        # full, 11-digit, or a short number that is padded to 8 digits
+        return rnd.choice([value, "999" + value, value.lstrip("0") or "0"])
+    if kind < .65:
+        lo, hi = rnd.randint(0, 60), rnd.randint(0, 60)
+        return f"{base}{lo:04d}{RANGE_SEP}{rnd.choice(['', '777'])}{base}{hi:04d}"
+    return value[:rnd.randint(1, 7)] + PREFIX_MARK
+
+def random_case(rnd):
+    papers = [f"P{i}" for i in range(rnd.randint(1, 3))]
+    bases = ["2021", "0000"]
+    entries = [(rnd.choice(papers), random_token(rnd, rnd.choice(bases)), f"D{k}")
+               for k in range(rnd.randint(0, 12))]
+    rolls = [f"{rnd.choice(['100', '999'])}{rnd.choice(bases)}{rnd.randint(0, 60):04d}" for _ in range(30)]
+    df = pd.DataFrame({
+        'Rollno': rolls,
+        'name': [f"S{i}" for i in range(len(rolls))],
+        'Paper Code': [rnd.choice(papers + ["PX"]) for _ in rolls],
+    })
+    df['last8'] = df['Rollno'].str[-8:]
+    return entries, df
+
+def test_lookup_matches_reference():
+    for case in range(2000):
+        entries, df = random_case(random.Random(case))
+        got = list(MappingIndex(entries).lookup(df))
+        expected = [reference_dept(entries, p, l8) for p, l8 in zip(df['Paper Code'], df['last8'])]
+        assert got == expected, f"case {case}"
+
+def test_assign_departments_splits_unmapped():
+    df = pd.DataFrame({'Rollno': ["10020210001", "10020210002"], 'name': ["a", "b"],
+                       'Paper Code': ["P1", "P1"], 'last8': ["20210001", "20210002"]})
+    mapped, unmapped = assign_departments(df, build_index("P1-20210001-CSE"))
+    assert list(mapped['department']) == ["CSE"]
+    assert list(unmapped.columns) == ['Rollno', 'name', 'Paper Code']
+    assert list(unmapped['Rollno']) == ["10020210002"]
+
+def test_parse_mapping_input():
+    assert parse_mapping_input("P1-42-2021*-CSE, P2-1..9-ECE, junk") == [
+        ("P1", "42", "CSE"), ("P1", "2021*", "CSE"), ("P2", "1..9", "ECE")]
+
+def test_read_csv_header_by_name():
+    content = b"Department,Roll,Paper Code\nCSE,2021*,P1\nECE,20210001..20210009,P2\n"
+    assert read_mapping_file(content) == [("P1", "2021*", "CSE"), ("P2", "20210001..20210009", "ECE")]
+
+def test_read_csv_by_position():
+    assert read_mapping_file(b"P1,20210042,CSE\r\nP2,7,ME\r\n") == [("P1", "20210042", "CSE"), ("P2", "7", "ME")]
+
+def test_read_ragged_csv():
+    content = b"P1,20210042\nP1,20210043,CSE,extra\n,,\nP2,,ME\n"
+    assert read_mapping_file(content) == [("P1", "20210043", "CSE")]
+
+def test_read_non_utf8_csv():
+    content = "P1,20210042,Génie\n".encode("cp1252")
+    assert read_mapping_file(content) == [("P1", "20210042", "Génie")]
+
+def test_read_xlsx():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Paper", "Rolls", "Dept"])
+    ws.append(["P1", 20210042, "CSE"])
+    ws.append(["P1", None, "CSE"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    assert read_mapping_file(buf.getvalue()) == [("P1", "20210042", "CSE")]
+
+@pytest.mark.parametrize("content", [b"", b"\n\n", b"PK\x03\x04not a workbook", b"Paper,Roll,Dept\nP1,,CSE\n"])
+def test_read_invalid_file(content):
+    with pytest.raises(InvalidMappingFile):
+        read_mapping_file(content)
+
+def test_invalid_mapping_file_is_a_400():
+    from fastapi.testclient import TestClient
+    import main
+    roster = io.BytesIO()
+    Workbook().save(roster)
+    files = [("excel_files", ("r.xlsx", roster.getvalue())), ("template_docx", ("t.docx", b"")),
+             ("mapping_file", ("m.xlsx", b"PK\x03\x04not a workbook"))]
+    data = {"room_specs": "R1:10:2x5", "date": "d", "time": "t"}
+    with TestClient(main.app) as client:
+        for path in ["/generate-seating-plan", "/plans"]:
+            response = client.post(path, files=files, data=data)
+            assert response.status_code == 400, path
+            assert "XLSX" in response.json()["detail"]
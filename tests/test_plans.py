@@ -0,0 +1,72 @@
+# tests/test_plans.py
+import random
+from collections import Counter
+import pandas as pd
+from allocator import allocate
+from mapping import UNMAPPED_COLUMNS
+from plans import PlanState, edit_rooms, room_fingerprint
+
+def stored_plan(rooms, groups):
+    allocator, plan = allocate(rooms, groups)
+    state = PlanState(allocator, plan, rooms, [b""] * len(plan),
+                      [room_fingerprint(name, grid) for name, grid in plan], b"", "d", "t",
+                      False, pd.DataFrame(columns=UNMAPPED_COLUMNS), b"", [Counter()] * len(plan))
+    # go through the stored form, as PATCH /plans/{id} does
+    return PlanState.from_arrays(state.to_arrays())
+
+def random_case(rnd):
+    groups = {f"P{i}": [(f"r{i}_{j}", f"D{rnd.randint(0, 2)}")
+                        for j in range(rnd.choice([1, 2, 5, 9, 10, 11, 30]))]
+              for i in range(rnd.randint(1, 6))}
+    rooms = [(f"R{k}", rnd.randint(1, 6), rnd.randint(1, 8)) for k in range(rnd.randint(1, 7))]
+    return rooms, groups
+
+def random_delta(rnd, state, case):
+    names = [name for name, _, _ in state.rooms]
+    rolls = list(state.rolls)
+    delta = {"remove_rooms": [], "layouts": {}, "add_rooms": [], "add_students": [], "remove_students": []}
+    if rnd.random() < .3 and len(names) > 1:
+        delta["remove_rooms"] = rnd.sample(names, 1)
+    if rnd.random() < .3:
+        delta["layouts"] = {rnd.choice(names): (rnd.randint(1, 6), rnd.randint(1, 8))}
+    if rnd.random() < .3:
+        delta["add_rooms"] = [(f"N{case}", rnd.randint(1, 6), rnd.randint(1, 8))]
+    if rnd.random() < .5:
+        delta["remove_students"] = rnd.sample(rolls, min(len(rolls), rnd.randint(1, 3)))
+    if rnd.random() < .5:
+        delta["add_students"] = [(f"x{case}_{i}", rnd.choice(state.papers + ["NEW"]), "DX")
+                                 for i in range(rnd.randint(1, 3))]
+    return delta
+
+def expected_groups(state, delta):
+    # the stored students in stored paper order, then papers new to the plan
+    removed = set(delta["remove_students"])
+    groups = {}
+    for k, paper in enumerate(state.papers):
+        lo, hi = state.offsets[k], state.offsets[k + 1]
+        groups[paper] = [(roll, dept) for roll, dept in zip(state.rolls[lo:hi], state.depts[lo:hi])
+                         if roll not in removed]
+    for roll, paper, dept in delta["add_students"]:
+        groups.setdefault(paper, []).append((roll, dept))
+    return groups
+
+def grids(plan):
+    return [(name, grid.rolls, grid.depts, grid.papers) for name, grid in plan]
+
+def test_replan_matches_full_allocation():
+    for case in range(3000):
+        rnd = random.Random(case)
+        state = stored_plan(*random_case(rnd))
+        delta = random_delta(rnd, state, case)
+        groups = expected_groups(state, delta)
+
+        rooms, first_room = edit_rooms(state.rooms, delta["remove_rooms"], delta["layouts"], delta["add_rooms"])
+        allocator, plan, first = state.replan(rooms, first_room, delta["add_students"], delta["remove_students"])
+        full, full_plan = allocate(rooms, groups)
+
+        assert allocator.papers == full.papers, f"case {case}"
+        assert grids(plan) == grids(full_plan), f"case {case}"
+        assert len(allocator.checkpoints) == len(full.checkpoints), f"case {case}"
+        for (seated, queue), (full_seated, full_queue) in zip(allocator.checkpoints, full.checkpoints):
+            assert list(seated) == list(full_seated) and queue == full_queue, f"case {case}"
+        assert first == len(plan) or plan[first][0] == rooms[first][0], f"case {case}"
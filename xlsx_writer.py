@@ -0,0 +1,109 @@
+# xlsx_writer.py
+import io, zipfile
+from collections import Counter, defaultdict
+from copy import copy
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+
+ROOM_COUNTS_SHEET = "Room Counts"
+PAPER_COUNTS_SHEET = "Paper Counts"
+
+class StyleCache:
+    # one registered fill per paper; cells copy the prepared style array
+    # instead of re-hashing a new PatternFill for every seat
+    def __init__(self, paper_colors):
+        self.paper_colors = paper_colors
+        self.styles = {}
+
+    def cell(self, ws, value, paper):
+        cell = WriteOnlyCell(ws, value=value)
+        if paper:
+            if paper not in self.styles:
+                color = self.paper_colors.get(paper, "FFFFFF")
+                proto = WriteOnlyCell(ws)
+                proto.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+                self.styles[paper] = proto._style
+            cell._style = copy(self.styles[paper])
+        return cell
+
+    def register(self, ws):
+        # fix every paper's style id up front, in paper order, so a sheet's
+        # XML does not depend on which sheets were written before it
+        for paper in self.paper_colors:
+            self.cell(ws, None, paper).style_id
+
+def room_rows(ws, grid, styles, room_counts):
+    cols = grid.cols
+    yield [None] + [f"{dpt}\n{'ROW-1' if c < cols // 2 else 'ROW-2'}" for c, dpt in enumerate(grid.dominant_depts())]
+    for r, (rolls, papers, depts) in enumerate(zip(grid.rolls, grid.papers, grid.depts)):
+        row = [f"Row {r+1}"]
+        for roll, paper, dept in zip(rolls, papers, depts):
+            row.append(styles.cell(ws, roll, paper))
+            if roll:
+                room_counts[(paper, dept)] += 1
+        yield row
+
+def sheet_name(i):
+    return f"xl/worksheets/sheet{i + 1}.xml"
+
+def read_sheets(xlsx_bytes, indexes):
+    with zipfile.ZipFile(io.BytesIO(xlsx_bytes)) as src:
+        return {i: src.read(sheet_name(i)) for i in indexes}
+
+def splice_sheets(xlsx_bytes, sheets):
+    src = zipfile.ZipFile(io.BytesIO(xlsx_bytes))
+    parts = {sheet_name(i): data for i, data in sheets.items()}
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            dst.writestr(info, parts.get(info.filename) or src.read(info))
+    return out.getvalue()
+
+def render_workbook(plan, paper_colors, count_sheets=False, sheets=None):
+    # Returns the workbook bytes and each room's (paper, department) counts.
+    # sheets maps a room's index to (worksheet XML, counts) kept from an
+    # earlier render with the same paper_colors; those rooms are written
+    # empty here and their stored XML is swapped in after saving.
+    sheets = sheets or {}
+    wb = Workbook(write_only=True)
+    # styles live on the workbook, so the cache is shared by every room sheet
+    styles = StyleCache(paper_colors)
+    room_totals = []
+    for i, (room_name, grid) in enumerate(plan):
+        ws = wb.create_sheet(title=room_name)
+        if i == 0: styles.register(ws)
+        if i in sheets:
+            room_totals.append(Counter(sheets[i][1]))
+            continue
+        room_counts = Counter()
+        for row in room_rows(ws, grid, styles, room_counts):
+            ws.append(row)
+        room_totals.append(room_counts)
+
+    if count_sheets:
+        paper_totals = defaultdict(lambda: [0, 0])
+        ws = wb.create_sheet(title=ROOM_COUNTS_SHEET)
+        ws.append(["Room", "Paper Code", "Department", "Students"])
+        for (room_name, _), room_counts in zip(plan, room_totals):
+            papers = Counter()
+            for (paper, dept), count in room_counts.items():
+                ws.append([room_name, paper, dept, count])
+                papers[paper] += count
+            for paper, count in papers.items():
+                paper_totals[paper][0] += count
+                paper_totals[paper][1] += 1
+        ws = wb.create_sheet(title=PAPER_COUNTS_SHEET)
+        ws.append(["Paper Code", "Students", "Rooms"])
+        for paper, (count, rooms) in paper_totals.items():
+            ws.append([paper, count, rooms])
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    content = buf.getvalue()
+    if sheets:
+        content = splice_sheets(content, {i: xml for i, (xml, _) in sheets.items()})
+    return content, room_totals
+
+def render_xlsx(plan, paper_colors, count_sheets=False):
+    return render_workbook(plan, paper_colors, count_sheets)[0]